@@ -1,9 +1,18 @@
 # dashboard.py
 import streamlit as st
+import numpy as np
 import pandas as pd
+import polars as pl
 import plotly.express as px
+from tsdownsample import LTTBDownsampler
 import os
 
+# Filtered frames below are never modified in place, so Copy-on-Write lets them
+# share memory with their parent instead of taking defensive copies.
+# (Always on from pandas 3.0, where the option is deprecated.)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # --- Page Configuration ---
 st.set_page_config(layout="wide", page_title="Fastener Pricing Intelligence")
 
@@ -11,52 +20,147 @@ st.set_page_config(layout="wide", page_title="Fastener Pricing Intelligence")
 # It's good practice to define file paths at the top.
 # This assumes your script is in the root and data is in a subfolder.
 SCRAPING_DATA_FOLDER = 'data/scraping_data'
-PRODUCTS_CSV = os.path.join(SCRAPING_DATA_FOLDER, 'products.csv')
-SNAPSHOTS_CSV = os.path.join(SCRAPING_DATA_FOLDER, 'price_inventory_snapshots.csv')
+PRODUCTS_PARQUET = os.path.join(SCRAPING_DATA_FOLDER, 'products.parquet')
+# One Parquet file per scrape date, written by run_daily_scrape.py
+SNAPSHOTS_DIR = os.path.join(SCRAPING_DATA_FOLDER, 'price_inventory_snapshots')
+
+# Only the columns the dashboard uses are read from the Parquet files
+PRODUCT_COLUMNS = ['product_id', 'site', 'fastener_type', 'material', 'grade_or_alloy', 'manufacturer']
+SNAPSHOT_COLUMNS = ['product_id', 'date_scraped', 'price_per_unit', 'inventory_level']
+
+# Text columns stored as pandas categoricals after loading
+CATEGORICAL_COLUMNS = ['fastener_type', 'material', 'manufacturer', 'product_id', 'site', 'grade_or_alloy']
+
+# Above this many products, box plots only draw outliers instead of every point
+BOX_POINTS_MAX_PRODUCTS = 500
+
+# Time series longer than this are reduced to DOWNSAMPLE_POINTS points (LTTB) before plotting
+DOWNSAMPLE_THRESHOLD = 1000
+DOWNSAMPLE_POINTS = 500
 
 # --- Data Loading ---
+def get_files_token():
+    """Return the data files' modification times, or None if the data is missing.
+
+    Used as the cache key for the cached functions below, so they only reload
+    when a scrape has written new data. Adding a daily snapshot file updates
+    the snapshots folder's modification time.
+    """
+    if not os.path.exists(PRODUCTS_PARQUET) or not os.path.isdir(SNAPSHOTS_DIR) or not os.listdir(SNAPSHOTS_DIR):
+        return None
+    return (os.path.getmtime(PRODUCTS_PARQUET), os.path.getmtime(SNAPSHOTS_DIR))
+
 @st.cache_data
-def load_data():
+def load_data(files_token):
     """Load and merge data, handling potential file errors."""
-    if not os.path.exists(PRODUCTS_CSV) or not os.path.exists(SNAPSHOTS_CSV):
+    if files_token is None:
         return None
     
-    products_df = pd.read_csv(PRODUCTS_CSV)
-    snapshots_df = pd.read_csv(SNAPSHOTS_CSV)
-    
-    # Convert date column for proper sorting and plotting
-    snapshots_df['date_scraped'] = pd.to_datetime(snapshots_df['date_scraped'])
+    # Parquet keeps column types, so date_scraped is already a datetime column
+    products_df = pl.read_parquet(PRODUCTS_PARQUET, columns=PRODUCT_COLUMNS)
+    snapshots_df = pl.read_parquet(os.path.join(SNAPSHOTS_DIR, '*.parquet'), columns=SNAPSHOT_COLUMNS)
     
     # Merge the two dataframes to have all info in one place
-    merged_df = pd.merge(snapshots_df, products_df, on='product_id')
+    merged_df = snapshots_df.join(products_df, on='product_id', how='inner')
+
+    # Hand a pandas frame back so the plotting code below is unchanged
+    merged_df = merged_df.to_pandas()
+
+    # Low-cardinality text columns repeat on every snapshot row; categorical codes
+    # make them smaller and speed up equality filters and groupby
+    for col in CATEGORICAL_COLUMNS:
+        merged_df[col] = merged_df[col].astype('category')
+
+    # Flag steel products once here rather than string-matching on every rerun
+    merged_df['is_steel'] = merged_df['material'].str.contains('steel', case=False, regex=False, na=False)
     return merged_df
 
-df = load_data()
+# --- Data Preparation ---
+@st.cache_data
+def prepare_fastener_data(_df, fastener_type, files_token):
+    """Filter to one fastener type and add the daily depletion rate.
+
+    The full dataframe is excluded from the cache key (leading underscore);
+    files_token stands in for it, so reruns with the same fastener type and
+    unchanged data files reuse the prepared frame.
+    """
+    filtered_df = _df[_df['fastener_type'] == fastener_type]
+    
+    # Sort by product and date to ensure correct calculation order
+    filtered_df = filtered_df.sort_values(['product_id', 'date_scraped'])
+    
+    # Correctly calculate depletion: Previous Day's Inventory - Current Day's Inventory
+    previous = filtered_df.groupby('product_id', sort=False, observed=True)['inventory_level'].shift(1).to_numpy(dtype=np.float64)
+    current = filtered_df['inventory_level'].to_numpy(dtype=np.float64)
+    
+    # Depletion is only positive changes. NaN (for the first day) and negative (restocks) become 0.
+    depletion = np.maximum(previous - current, 0)
+    depletion[np.isnan(previous)] = 0
+    filtered_df['daily_depletion_rate'] = depletion
+    return filtered_df
+
+@st.cache_data
+def get_latest_snapshots(_filtered_df, fastener_type, files_token):
+    """Return the most recent snapshot of each product for one fastener type."""
+    # The prepared frame is sorted by product and date, so the last row per product is the latest
+    return _filtered_df.drop_duplicates('product_id', keep='last')
+
+@st.cache_data
+def build_market_matrix(_filtered_df, fastener_type, files_token):
+    """Summarize steel products' price and sales velocity for the opportunity matrix.
+
+    Returns (steel_summary, median_price, median_velocity), or None if the
+    fastener type has no steel products.
+    """
+    # Filter for steel products only
+    steel_df = _filtered_df[_filtered_df['is_steel']]
+    if steel_df.empty:
+        return None
+
+    # Calculate average price and velocity for each steel product
+    steel_summary = steel_df.groupby('product_id', sort=False, observed=True).agg(
+        avg_price=('price_per_unit', 'mean'),
+        total_depletion=('daily_depletion_rate', 'sum'), # Use sum of depletion as a proxy for total velocity
+        days_tracked=('date_scraped', 'nunique')
+    ).reset_index()
+    
+    # Avoid division by zero
+    steel_summary = steel_summary.assign(avg_daily_depletion=np.where(
+        steel_summary['days_tracked'] > 0,
+        steel_summary['total_depletion'] / steel_summary['days_tracked'],
+        0
+    ))
+
+    # Get median values to draw quadrant lines
+    median_price = steel_summary['avg_price'].median()
+    median_velocity = steel_summary['avg_daily_depletion'].median()
+    return steel_summary, median_price, median_velocity
+
+def downsample_for_plot(product_df, y_col):
+    """Reduce a date-sorted time series to DOWNSAMPLE_POINTS rows, keeping its visual shape."""
+    if len(product_df) <= DOWNSAMPLE_THRESHOLD:
+        return product_df
+    indices = LTTBDownsampler().downsample(
+        product_df['date_scraped'].to_numpy(),
+        product_df[y_col].to_numpy(dtype=np.float64),
+        n_out=DOWNSAMPLE_POINTS
+    )
+    return product_df.iloc[indices]
+
+files_token = get_files_token()
+df = load_data(files_token)
 
 st.title("Titanium Fastener Pricing Intelligence Engine (MVP)")
 
 if df is None:
-    st.error(f"Data not found. Ensure '{PRODUCTS_CSV}' and '{SNAPSHOTS_CSV}' exist. Run your scraping script.")
+    st.error(f"Data not found. Ensure '{PRODUCTS_PARQUET}' and '{SNAPSHOTS_DIR}' exist. Run your scraping script.")
 else:
     # --- Sidebar Filters ---
     st.sidebar.header("Global Filters")
     fastener_type = st.sidebar.selectbox("Select Fastener Type", df['fastener_type'].unique())
     
-    # Filter dataframe based on selection
-    filtered_df = df[df['fastener_type'] == fastener_type].copy()
-    
-    # ==================================
-    # === FIX: Correct Depletion Rate Calculation ===
-    # Sort by product and date to ensure correct calculation order
-    filtered_df = filtered_df.sort_values(['product_id', 'date_scraped'])
-    
-    # Correctly calculate depletion: Previous Day's Inventory - Current Day's Inventory
-    # .diff() calculates (current - previous), so we multiply by -1
-    inventory_change = filtered_df.groupby('product_id')['inventory_level'].diff() * -1
-    
-    # Depletion is only positive changes. NaN (for the first day) and negative (restocks) become 0.
-    filtered_df['daily_depletion_rate'] = inventory_change.apply(lambda x: x if pd.notna(x) and x > 0 else 0)
-    # ==================================
+    # Filter, sort and compute depletion once per fastener type (cached across reruns)
+    filtered_df = prepare_fastener_data(df, fastener_type, files_token)
 
     # --- Dashboard Tabs ---``
     tab1, tab2, tab3 = st.tabs(["Price Benchmarking", "Inventory Velocity", "Market Opportunity"])
@@ -65,7 +169,7 @@ else:
         st.header(f"Price Benchmarking for {fastener_type.title()}")
         
         # Get latest snapshot for each product for accurate current pricing
-        latest_df = filtered_df.loc[filtered_df.groupby('product_id')['date_scraped'].idxmax()]
+        latest_df = get_latest_snapshots(filtered_df, fastener_type, files_token)
 
         # Visualization
         fig = px.box(
@@ -73,7 +177,7 @@ else:
             x='material', 
             y='price_per_unit', 
             color='material',
-            points='all',
+            points='all' if len(latest_df) <= BOX_POINTS_MAX_PRODUCTS else 'outliers',
             hover_data=['product_id', 'manufacturer'],
             title=f"Price Per Unit Distribution by Material"
         )
@@ -82,7 +186,7 @@ else:
         # Price Gap Calculation
         try:
             titanium_price = latest_df[latest_df['material'] == 'titanium']['price_per_unit'].median()
-            steel_price = latest_df[latest_df['material'].str.contains('steel', case=False)]['price_per_unit'].median()
+            steel_price = latest_df[latest_df['is_steel']]['price_per_unit'].median()
 
             if pd.notna(titanium_price) and pd.notna(steel_price):
                 price_gap = titanium_price - steel_price
@@ -110,7 +214,7 @@ else:
                 filtered_df['product_id'].unique()
             )
             
-            product_df = filtered_df[filtered_df['product_id'] == product_to_track].copy()
+            product_df = filtered_df[filtered_df['product_id'] == product_to_track]
             
             # --- FIX: No need to recalculate depletion rate here, it's already on the dataframe ---
 
@@ -119,7 +223,7 @@ else:
             
             with col1:
                 fig_inv = px.line(
-                    product_df, 
+                    downsample_for_plot(product_df, 'inventory_level'), 
                     x='date_scraped', 
                     y='inventory_level', 
                     title=f"Inventory Level Over Time for {product_to_track}",
@@ -129,7 +233,7 @@ else:
                 
             with col2:
                 fig_dep = px.bar(
-                    product_df, 
+                    downsample_for_plot(product_df, 'daily_depletion_rate'), 
                     x='date_scraped', 
                     y='daily_depletion_rate', 
                     title=f"Daily Depletion Rate for {product_to_track}"
@@ -142,40 +246,24 @@ else:
         st.header("Market Opportunity Matrix")
         st.markdown("Find high-price, high-velocity steel products that are prime candidates for titanium conversion.")
         
-        # Filter for steel products only
-        steel_df = filtered_df[filtered_df['material'].str.contains('steel', case=False)].copy()
+        market_matrix = build_market_matrix(filtered_df, fastener_type, files_token)
         
-        if steel_df.empty:
+        if market_matrix is None:
             st.warning("No steel products found for this fastener type.")
         else:
-            # Calculate average price and velocity for each steel product
-            steel_summary = steel_df.groupby('product_id').agg(
-                avg_price=('price_per_unit', 'mean'),
-                total_depletion=('daily_depletion_rate', 'sum'), # Use sum of depletion as a proxy for total velocity
-                days_tracked=('date_scraped', 'nunique')
-            ).reset_index()
-            
-            # Avoid division by zero
-            steel_summary['avg_daily_depletion'] = steel_summary.apply(
-                lambda row: row['total_depletion'] / row['days_tracked'] if row['days_tracked'] > 0 else 0,
-                axis=1
+            steel_summary, median_price, median_velocity = market_matrix
+
+            fig_matrix = px.scatter(
+                steel_summary,
+                x='avg_price',
+                y='avg_daily_depletion',
+                text='product_id',
+                render_mode='webgl',
+                title="Steel Products: Price vs. Sales Velocity"
             )
+            fig_matrix.add_vline(x=median_price, line_dash="dash", annotation_text="Median Price")
+            fig_matrix.add_hline(y=median_velocity, line_dash="dash", annotation_text="Median Velocity")
+            fig_matrix.update_traces(textposition='top center')
+            st.plotly_chart(fig_matrix, use_container_width=True)
             
-            if not steel_summary.empty:
-                # Get median values to draw quadrant lines
-                median_price = steel_summary['avg_price'].median()
-                median_velocity = steel_summary['avg_daily_depletion'].median()
-
-                fig_matrix = px.scatter(
-                    steel_summary,
-                    x='avg_price',
-                    y='avg_daily_depletion',
-                    text='product_id',
-                    title="Steel Products: Price vs. Sales Velocity"
-                )
-                fig_matrix.add_vline(x=median_price, line_dash="dash", annotation_text="Median Price")
-                fig_matrix.add_hline(y=median_velocity, line_dash="dash", annotation_text="Median Velocity")
-                fig_matrix.update_traces(textposition='top center')
-                st.plotly_chart(fig_matrix, use_container_width=True)
-                
-                st.info("**Target Quadrant (Top-Right):** Products in this area are expensive (for steel) yet still sell fast. They represent the best opportunity for a premium titanium substitute.")
\ No newline at end of file
+            st.info("**Target Quadrant (Top-Right):** Products in this area are expensive (for steel) yet still sell fast. They represent the best opportunity for a premium titanium substitute.")
\ No newline at end of file
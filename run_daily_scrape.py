@@ -1,15 +1,33 @@
+import numpy as np
 import pandas as pd
 import os
-import random
 from datetime import date, timedelta
 
 # --- Configuration ---
 SCRAPING_DATA_FOLDER = 'data/scraping_data'
 SITE_NAME = 'mcmaster_clone'
 
+PRODUCTS_PARQUET = os.path.join(SCRAPING_DATA_FOLDER, 'products.parquet')
+# Snapshots are append-only: one Parquet file per scrape date in this folder
+SNAPSHOTS_DIR = os.path.join(SCRAPING_DATA_FOLDER, 'price_inventory_snapshots')
+
+# Legacy single-file tables, migrated the first time they are found
+SNAPSHOTS_PARQUET = os.path.join(SCRAPING_DATA_FOLDER, 'price_inventory_snapshots.parquet')
 PRODUCTS_CSV = os.path.join(SCRAPING_DATA_FOLDER, 'products.csv')
 SNAPSHOTS_CSV = os.path.join(SCRAPING_DATA_FOLDER, 'price_inventory_snapshots.csv')
 
+PRODUCT_COLUMNS = ['product_id', 'site', 'sku', 'fastener_type', 'material', 'grade_or_alloy', 'diameter_mm', 'length_mm', 'manufacturer', 'first_seen_date', 'last_seen_date']
+SNAPSHOT_COLUMNS = ['snapshot_id', 'product_id', 'date_scraped', 'price_per_unit', 'inventory_level']
+
+# Column types for reading the legacy CSV files without dtype inference
+PRODUCT_CSV_DTYPES = {
+    'product_id': 'str', 'site': 'str', 'sku': 'str', 'fastener_type': 'str', 'material': 'str',
+    'grade_or_alloy': 'str', 'diameter_mm': 'float64', 'length_mm': 'float64', 'manufacturer': 'str',
+    'first_seen_date': 'str', 'last_seen_date': 'str'
+}
+SNAPSHOT_CSV_DTYPES = {'snapshot_id': 'int64', 'product_id': 'str', 'price_per_unit': 'float64', 'inventory_level': 'int64'}
+SNAPSHOT_CSV_DATE_COLUMNS = ['date_scraped']
+
 # Ensure the scraping data folder exists
 os.makedirs(SCRAPING_DATA_FOLDER, exist_ok=True)
 
@@ -52,117 +70,130 @@ def get_current_date(snapshots_df):
         last_date = pd.to_datetime(snapshots_df['date_scraped']).max().date()
         return last_date + timedelta(days=1)
 
+def save_table(df, parquet_path):
+    """Writes a table to its compressed Parquet file."""
+    df.to_parquet(parquet_path, engine='pyarrow', compression='zstd', index=False)
+
+def load_table(parquet_path, csv_path, columns, csv_dtypes, csv_date_columns=()):
+    """Loads a table from Parquet, migrating the legacy CSV file if only that exists."""
+    if not os.path.exists(parquet_path) and os.path.exists(csv_path):
+        print(f"  -> Migrating {csv_path} to {parquet_path}")
+        legacy_df = pd.read_csv(csv_path, usecols=columns, dtype=csv_dtypes, parse_dates=list(csv_date_columns))
+        save_table(legacy_df, parquet_path)
+        os.remove(csv_path)
+
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    return pd.DataFrame(columns=columns)
+
+def save_snapshots(snapshots_df):
+    """Writes snapshots to one new file per scrape date, leaving earlier days untouched."""
+    snapshots_df = snapshots_df[SNAPSHOT_COLUMNS].astype({'date_scraped': 'datetime64[ns]'})
+    for scrape_date, day_df in snapshots_df.groupby('date_scraped'):
+        save_table(day_df, os.path.join(SNAPSHOTS_DIR, f"{scrape_date.strftime('%Y-%m-%d')}.parquet"))
+
+def load_snapshots():
+    """Loads every daily snapshot file, splitting a legacy single-file table into days first."""
+    if not os.path.isdir(SNAPSHOTS_DIR):
+        legacy_df = load_table(SNAPSHOTS_PARQUET, SNAPSHOTS_CSV, SNAPSHOT_COLUMNS, SNAPSHOT_CSV_DTYPES, SNAPSHOT_CSV_DATE_COLUMNS)
+        os.makedirs(SNAPSHOTS_DIR)
+        if not legacy_df.empty:
+            print(f"  -> Splitting {SNAPSHOTS_PARQUET} into daily files in {SNAPSHOTS_DIR}")
+            save_snapshots(legacy_df)
+        if os.path.exists(SNAPSHOTS_PARQUET):
+            os.remove(SNAPSHOTS_PARQUET)
+
+    if os.listdir(SNAPSHOTS_DIR):
+        # File names are ISO dates, so the files are read in chronological order
+        return pd.read_parquet(SNAPSHOTS_DIR)
+    return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+
 def simulate_daily_changes(products_df, snapshots_df):
-    """Generates a new list of product data with simulated daily changes."""
+    """Generates a DataFrame of product data with simulated daily changes."""
     today = get_current_date(snapshots_df)
     print(f"Simulating scrape for date: {today.strftime('%Y-%m-%d')}")
 
-    output_data = []
-    for product_data in SIMULATED_PRODUCTS:
-        product_id = f"{SITE_NAME}_{product_data['sku']}"
-        
-        # Get the most recent snapshot for this product to simulate changes
-        last_snapshot = snapshots_df[snapshots_df['product_id'] == product_id]
-        if not last_snapshot.empty:
-            last_inventory = last_snapshot.iloc[-1]['inventory_level']
-            last_price = last_snapshot.iloc[-1]['price_per_unit']
-        else:
-            last_inventory = product_data['inventory']
-            last_price = product_data['price_per_unit']
-
-        # Simulate inventory depletion
-        depletion = random.randint(int(last_inventory * 0.01), int(last_inventory * 0.05))
-        new_inventory = last_inventory - depletion
-        
-        # Simulate occasional restocking
-        if random.random() < 0.05: # 5% chance of restocking
-            print(f"  -> Restocking {product_id}")
-            new_inventory += product_data['inventory'] # Add original stock amount
-
-        # Simulate minor price fluctuations
-        price_change = random.uniform(-0.03, 0.03)
-        new_price = round(last_price * (1 + price_change), 2)
-
-        # Create a copy and update with dynamic data
-        new_data = product_data.copy()
-        new_data['price_per_unit'] = new_price
-        new_data['inventory'] = max(0, new_inventory) # Ensure inventory doesn't go below 0
-        new_data['date_scraped'] = today
-        output_data.append(new_data)
-        
-    return output_data
+    rng = np.random.default_rng()
+    scraped_df = pd.DataFrame(SIMULATED_PRODUCTS)
+    scraped_df['product_id'] = SITE_NAME + '_' + scraped_df['sku']
+    original_inventory = scraped_df['inventory'].to_numpy()
+
+    # Get the most recent snapshot for every product to simulate changes
+    last_snapshots = snapshots_df.drop_duplicates('product_id', keep='last').set_index('product_id')
+    last_state = last_snapshots.reindex(scraped_df['product_id'])
+    has_history = scraped_df['product_id'].isin(last_snapshots.index).to_numpy()
+    last_inventory = np.where(has_history, last_state['inventory_level'], original_inventory).astype(np.int64)
+    last_price = np.where(has_history, last_state['price_per_unit'], scraped_df['price_per_unit']).astype(np.float64)
+
+    # Simulate inventory depletion (1-5% of last inventory, inclusive)
+    depletion = rng.integers((last_inventory * 0.01).astype(np.int64), (last_inventory * 0.05).astype(np.int64), endpoint=True)
+    new_inventory = last_inventory - depletion
+
+    # Simulate occasional restocking
+    restock = rng.random(len(scraped_df)) < 0.05 # 5% chance of restocking
+    for product_id in scraped_df.loc[restock, 'product_id']:
+        print(f"  -> Restocking {product_id}")
+    new_inventory += np.where(restock, original_inventory, 0) # Add original stock amount
+
+    # Simulate minor price fluctuations
+    price_change = rng.uniform(-0.03, 0.03, size=len(scraped_df))
+    new_price = np.round(last_price * (1 + price_change), 2)
+
+    # Update with dynamic data
+    scraped_df['price_per_unit'] = new_price
+    scraped_df['inventory'] = np.maximum(0, new_inventory) # Ensure inventory doesn't go below 0
+    scraped_df['date_scraped'] = today
+    return scraped_df
 
 def main():
     """Main function to run the ETL process."""
     # 1. Load existing data or create empty DataFrames
-    if os.path.exists(PRODUCTS_CSV):
-        products_df = pd.read_csv(PRODUCTS_CSV)
-    else:
-        products_df = pd.DataFrame(columns=['product_id', 'site', 'sku', 'fastener_type', 'material', 'grade_or_alloy', 'diameter_mm', 'length_mm', 'manufacturer', 'first_seen_date', 'last_seen_date'])
-
-    if os.path.exists(SNAPSHOTS_CSV):
-        snapshots_df = pd.read_csv(SNAPSHOTS_CSV)
-    else:
-        snapshots_df = pd.DataFrame(columns=['snapshot_id', 'product_id', 'date_scraped', 'price_per_unit', 'inventory_level'])
+    products_df = load_table(PRODUCTS_PARQUET, PRODUCTS_CSV, PRODUCT_COLUMNS, PRODUCT_CSV_DTYPES)
+    snapshots_df = load_snapshots()
 
     # 2. Get today's "scraped" data
-    scraped_data = simulate_daily_changes(products_df, snapshots_df)
-    today_str = scraped_data[0]['date_scraped'].strftime('%Y-%m-%d')
-    
-    new_products = []
-    new_snapshots = []
-
-    # 3. Process each "scraped" item
-    for item in scraped_data:
-        product_id = f"{SITE_NAME}_{item['sku']}"
-
-        # --- Update Products Table ---
-        if product_id not in products_df['product_id'].values:
-            print(f"  -> New product found: {product_id}. Adding to products table.")
-            new_product = {
-                'product_id': product_id,
-                'site': SITE_NAME,
-                'sku': item['sku'],
-                'fastener_type': item['fastener_type'],
-                'material': item['material'],
-                'grade_or_alloy': item['grade_or_alloy'],
-                'diameter_mm': item['diameter_mm'],
-                'length_mm': item['length_mm'],
-                'manufacturer': item['manufacturer'],
-                'first_seen_date': today_str,
-                'last_seen_date': today_str
-            }
-            new_products.append(new_product)
-        else:
-            # Update the 'last_seen_date' for existing products
-            products_df.loc[products_df['product_id'] == product_id, 'last_seen_date'] = today_str
-
-        # --- Always create a new snapshot ---
-        new_snapshot = {
-            'product_id': product_id,
-            'date_scraped': today_str,
-            'price_per_unit': item['price_per_unit'],
-            'inventory_level': item['inventory']
-        }
-        new_snapshots.append(new_snapshot)
-    
+    scraped_df = simulate_daily_changes(products_df, snapshots_df)
+    today_str = scraped_df['date_scraped'].iloc[0].strftime('%Y-%m-%d')
+
+    # 3. Update the products table for all scraped items at once
+    is_new = ~scraped_df['product_id'].isin(products_df['product_id'])
+    for product_id in scraped_df.loc[is_new, 'product_id']:
+        print(f"  -> New product found: {product_id}. Adding to products table.")
+
+    # Update the 'last_seen_date' for existing products
+    products_df.loc[products_df['product_id'].isin(scraped_df['product_id']), 'last_seen_date'] = today_str
+
+    new_products_df = scraped_df.loc[is_new].assign(
+        site=SITE_NAME,
+        first_seen_date=today_str,
+        last_seen_date=today_str
+    )[products_df.columns]
+
+    # --- Always create a new snapshot ---
+    # Columns are built with the stored types, so nothing is inferred or cast on save
+    new_snapshots_df = pd.DataFrame({
+        'product_id': scraped_df['product_id'].to_numpy(),
+        'date_scraped': np.full(len(scraped_df), np.datetime64(today_str, 'ns')),
+        'price_per_unit': scraped_df['price_per_unit'].to_numpy(dtype=np.float64),
+        'inventory_level': scraped_df['inventory'].to_numpy(dtype=np.int64)
+    })
+
     # 4. Append new data and save
-    if new_products:
-        products_df = pd.concat([products_df, pd.DataFrame(new_products)], ignore_index=True)
+    if not new_products_df.empty:
+        products_df = pd.concat([products_df, new_products_df], ignore_index=True)
     
-    if new_snapshots:
-        new_snapshots_df = pd.DataFrame(new_snapshots)
+    if not new_snapshots_df.empty:
         # Add snapshot_id
         last_id = snapshots_df['snapshot_id'].max() if not snapshots_df.empty else -1
-        new_snapshots_df['snapshot_id'] = range(last_id + 1, last_id + 1 + len(new_snapshots_df))
-        snapshots_df = pd.concat([snapshots_df, new_snapshots_df], ignore_index=True)
+        new_snapshots_df['snapshot_id'] = np.arange(last_id + 1, last_id + 1 + len(new_snapshots_df), dtype=np.int64)
+        # Only today's rows are written; the snapshot history is never rewritten
+        save_snapshots(new_snapshots_df)
 
-    products_df.to_csv(PRODUCTS_CSV, index=False)
-    snapshots_df.to_csv(SNAPSHOTS_CSV, index=False)
+    save_table(products_df, PRODUCTS_PARQUET)
     
-    print("\nDaily scrape simulation complete. CSV files have been updated.")
+    print("\nDaily scrape simulation complete. Parquet files have been updated.")
     print(f"Total products: {len(products_df)}")
-    print(f"Total snapshots: {len(snapshots_df)}")
+    print(f"Total snapshots: {len(snapshots_df) + len(new_snapshots_df)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file